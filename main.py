@@ -1,7 +1,17 @@
 #!/usr/bin/env python3
-import argparse, csv, json, sys, time, logging
-from typing import Dict, Any, List, Optional
+import argparse, csv, json, sys, time, logging, os, hashlib, sqlite3, threading, functools
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import deque
+from itertools import islice
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
 import requests
+try:
+    import orjson  # optional, deutlich schnelleres JSON
+except ImportError:
+    orjson = None
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # ---------------------------- Logging -----------------------------------------
 def setup_logging(level: str = "INFO"):
@@ -23,116 +33,431 @@ def fmt_duration(seconds: float) -> str:
     return f"{s}s"
 
 # ---------------------------- API Helper --------------------------------------
-_session = requests.Session()
+# Pool groß genug für die parallelen Worker, sonst verwirft urllib3 Verbindungen
+POOL_SIZE = 32
+AVAIL_WORKERS = 16
+HISTORY_WORKERS = 8
 
-def call_api(base_url: str, apikey: str, cmd: str, **params) -> Any:
-    url = base_url.rstrip("/") + "/api/v2"
-    payload = {"apikey": apikey, "cmd": cmd}
-    payload.update({k: v for k, v in params.items() if v is not None})
-    r = _session.get(url, params=payload, timeout=30)
+_session = requests.Session()
+# Transiente Fehler (429/5xx) mit exponentiellem Backoff wiederholen
+_retry = Retry(
+    total=3, backoff_factor=0.3,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset(["GET"]),
+    raise_on_status=False,
+)
+
+def _mount_adapter(pool_size: int) -> None:
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=_retry)
+    _session.mount("http://", adapter)
+    _session.mount("https://", adapter)
+
+_mount_adapter(POOL_SIZE)
+_session.headers["Accept-Encoding"] = "gzip"
+
+def configure_concurrency(workers: int) -> None:
+    """Setzt die Parallelität aller Netzwerk-Phasen (--workers) und passt den Pool an."""
+    global AVAIL_WORKERS, HISTORY_WORKERS
+    workers = max(1, workers)
+    AVAIL_WORKERS = workers
+    HISTORY_WORKERS = max(1, workers // 2)
+    if workers > POOL_SIZE:
+        _mount_adapter(workers)
+
+@dataclass
+class TautulliClient:
+    """Einmal pro Lauf erzeugt; URL und Basis-Parameter werden nicht je Request neu gebaut."""
+    base_url: str
+    apikey: str
+    session: requests.Session = field(default_factory=lambda: _session)
+    url: str = field(init=False)
+    base_payload: Dict[str, Any] = field(init=False)
+
+    def __post_init__(self):
+        self.url = self.base_url.rstrip("/") + "/api/v2"
+        self.base_payload = {"apikey": self.apikey}
+
+# Was call_api samt Auswertung der Antwort werfen kann (HTTP, JSON, fehlende Felder, result != success)
+API_ERRORS = (requests.RequestException, ValueError, TypeError, KeyError, RuntimeError)
+
+def call_api(client: TautulliClient, cmd: str, **params) -> Any:
+    payload = {**client.base_payload, "cmd": cmd, **{k: v for k, v in params.items() if v is not None}}
+    r = client.session.get(client.url, params=payload, timeout=30)
     r.raise_for_status()
-    js = r.json()
+    js = orjson.loads(r.content) if orjson is not None else r.json()
     if js.get("response", {}).get("result") != "success":
         raise RuntimeError(f"API result != success for {cmd}: {js}")
     return js["response"]["data"]
 
-def resolve_user_id(base_url: str, apikey: str, name: str) -> int:
+def resolve_user_id(client: TautulliClient, name: str) -> int:
     name_lower = name.lower()
     logging.info("Löse user_id für '%s'…", name)
     # 1) get_users (bevorzugt)
     try:
-        users = call_api(base_url, apikey, "get_users")
+        users = call_api(client, "get_users")
         for u in users:
+            if not isinstance(u, dict):
+                continue
             if str(u.get("username", "")).lower() == name_lower or str(u.get("friendly_name", "")).lower() == name_lower:
                 uid = int(u["user_id"])
                 logging.info("→ user_id gefunden: %s", uid)
                 return uid
-    except Exception:
+    except (*API_ERRORS, AttributeError):
+        # auch unerwartete Antwortstruktur -> Fallback
         pass
     # 2) get_user_names (Fallback)
-    users2 = call_api(base_url, apikey, "get_user_names")
+    users2 = call_api(client, "get_user_names")
     for u in users2:
-        if str(u.get("friendly_name", "")).lower() == name_lower:
+        if isinstance(u, dict) and str(u.get("friendly_name", "")).lower() == name_lower:
             uid = int(u["user_id"])
             logging.info("→ user_id gefunden: %s", uid)
             return uid
     raise KeyError(f'User "{name}" wurde nicht gefunden.')
 
+USER_CACHE_TTL = 30 * 24 * 3600
+
+def resolve_user_id_cached(client: TautulliClient, name: str, path: str, refresh: bool = False) -> int:
+    """
+    resolve_user_id mit JSON-Cache {server: {name_lower: {user_id, ts}}}; --refresh-users erzwingt Neuauflösung.
+    """
+    srv, name_lower = _server_id(client.base_url), name.lower()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = None
+    if not isinstance(data, dict):
+        data = {}
+    # kaputte/fremde Struktur wie Cache-Miss behandeln
+    if not isinstance(data.get(srv), dict):
+        data[srv] = {}
+    entry = data[srv].get(name_lower)
+    if (not refresh and isinstance(entry, dict) and type(entry.get("user_id")) is int
+            and isinstance(entry.get("ts"), (int, float)) and time.time() - entry["ts"] < USER_CACHE_TTL):
+        uid = entry["user_id"]
+        logging.info("→ user_id aus Cache: %s", uid)
+        return uid
+    uid = resolve_user_id(client, name)
+    data[srv][name_lower] = {"user_id": uid, "ts": int(time.time())}
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # atomar schreiben, damit parallele Läufe keine halbe Datei hinterlassen
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        logging.debug("User-Cache nicht geschrieben: %s", e)
+    return uid
+
 # ----------------------- History (paginiert) ----------------------------------
-def fetch_history(base_url: str, apikey: str, user_id: int, media_type: str) -> List[Dict[str, Any]]:
-    assert media_type in ("episode", "movie")
-    results: List[Dict[str, Any]] = []
+HISTORY_PAGE = 1000
+# Nur diese Felder werden von den Aggregationen gelesen; der Rest wird direkt verworfen
+HISTORY_FIELDS = (
+    "media_type", "rating_key", "parent_rating_key", "grandparent_rating_key",
+    "grandparent_title", "title", "full_title", "year",
+    "date", "stopped", "started", "last_played",
+    "percent_complete", "view_offset", "duration", "media_duration",
+)
+
+def _history_page(client: TautulliClient, user_id: int, media_type: Optional[str],
+                  start: int) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """
+    Eine Seite get_history -> (auf HISTORY_FIELDS gekürzte Zeilen, Gesamtzahl oder None).
+    Gekürzt wird hier im Worker, damit vorgeladene Seiten nur die benötigten Felder halten.
+    """
+    data = call_api(
+        client, "get_history",
+        user_id=user_id, media_type=media_type,
+        start=start, length=HISTORY_PAGE, order_column="date", order_dir="asc",
+        include_activity=0,
+    )
+    rows = data["data"] if isinstance(data, dict) and "data" in data else data
+    return [{k: r[k] for k in HISTORY_FIELDS if k in r} for r in rows or ()], _history_total(data)
+
+def _history_total(data: Any) -> Optional[int]:
+    if isinstance(data, dict):
+        for k in ("recordsFiltered", "recordsTotal"):
+            if data.get(k) is not None:
+                return int(data[k])
+    return None
+
+def iter_history(client: TautulliClient, user_id: int, media_type: Optional[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Liefert die History seitenweise als Generator, damit die Aggregation ohne Gesamtliste auskommt.
+    media_type=None lädt alle Typen in einem Durchlauf.
+    """
+    assert media_type in ("episode", "movie", None)
+    label = {"episode": "Episoden", "movie": "Film", None: "Gesamt"}[media_type]
+    count = 0
     start = 0
-    page = 1000
-    logging.info("Lade %s-History…", "Episoden" if media_type == "episode" else "Film")
-    while True:
-        data = call_api(
-            base_url, apikey, "get_history",
-            user_id=user_id, media_type=media_type,
-            start=start, length=page, order_column="date", order_dir="asc",
-        )
-        rows = data["data"] if isinstance(data, dict) and "data" in data else data
-        if not rows:
-            break
-        results.extend(rows)
-        start += len(rows)
-        logging.debug("…geladen: %d Einträge", len(results))
-        if len(rows) < page:
-            break
-    logging.info("→ %d %s-History-Einträge", len(results), "Episoden" if media_type == "episode" else "Film")
-    return results
+    page = HISTORY_PAGE
+    logging.info("Lade %s-History…", label)
+    rows, total = _history_page(client, user_id, media_type, 0)
+    if total is not None:
+        # Gesamtzahl bekannt -> Folgeseiten in einem Fenster parallel vorladen, in Reihenfolge ausliefern
+        count += len(rows)
+        yield from rows
+        starts = iter(range(page, total, page))
+        with ThreadPoolExecutor(max_workers=HISTORY_WORKERS) as ex:
+            window = deque(ex.submit(_history_page, client, user_id, media_type, st)
+                           for st in islice(starts, HISTORY_WORKERS * 2))
+            while window:
+                rows = window.popleft().result()[0]
+                for st in starts:
+                    window.append(ex.submit(_history_page, client, user_id, media_type, st))
+                    break
+                count += len(rows)
+                logging.debug("…geladen: %d/%d Einträge", count, total)
+                yield from rows
+    else:
+        while True:
+            if not rows:
+                break
+            count += len(rows)
+            start += len(rows)
+            logging.debug("…geladen: %d Einträge", count)
+            yield from rows
+            if len(rows) < page:
+                break
+            rows = _history_page(client, user_id, media_type, start)[0]
+    logging.info("→ %d %s-History-Einträge", count, label)
+
+def fetch_history(client: TautulliClient, user_id: int, media_type: str) -> List[Dict[str, Any]]:
+    return list(iter_history(client, user_id, media_type))
 
 # ----------------------------- Utils ------------------------------------------
-def _ts_readable(ts: Any) -> str:
+@functools.lru_cache(maxsize=65536)
+def _ts_readable_num(ts: float) -> str:
     try:
-        if isinstance(ts, (int, float)):
-            return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(int(ts)))
-        return str(ts) if ts else ""
-    except Exception:
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(int(ts)))
+    except (OverflowError, OSError, ValueError):
+        # NaN/inf oder Zeitstempel außerhalb des darstellbaren Bereichs
         return ""
 
+def _ts_readable(ts: Any) -> str:
+    if isinstance(ts, (int, float)) and ts:
+        return _ts_readable_num(ts)
+    if ts:
+        return str(ts)
+    return ""
+
+_NUM_TYPES = (int, float)
+
+def _as_float(v: Any) -> Optional[float]:
+    """Zahl oder numerischer String -> float, sonst None. Häufige Fälle ohne try/except."""
+    if type(v) in _NUM_TYPES:
+        return float(v)
+    if v is None:
+        return None
+    if isinstance(v, str):
+        v = v.strip()
+        if v.replace(".", "", 1).isdecimal():
+            return float(v)
+        if not v:
+            return None
+    # selten: Vorzeichen, Exponent, bool, Decimal, …
+    try:
+        return float(v)
+    except (ValueError, TypeError):
+        return None
+
 def _percent_from_row(r: Dict[str, Any]) -> Optional[float]:
-    pc = r.get("percent_complete")
+    pc = _as_float(r.get("percent_complete"))
     if pc is not None:
-        try:
-            return float(pc)
-        except Exception:
-            pass
-    off = r.get("view_offset")
+        return pc
     dur = r.get("duration") or r.get("media_duration")
-    try:
-        off = float(off)
-        dur = float(dur)
-        if dur > 0:
-            # ms -> s Heuristik
-            if off > dur * 5:
-                off /= 1000.0
-            if dur > 100000:
-                dur /= 1000.0
-            return max(0.0, min(100.0, (off / dur) * 100.0))
-    except Exception:
-        pass
-    return None
+    if dur is None:
+        return None
+    off = _as_float(r.get("view_offset"))
+    dur = _as_float(dur)
+    if off is None or dur is None or not dur > 0:
+        return None
+    # ms -> s Heuristik
+    if off > dur * 5:
+        off /= 1000.0
+    if dur > 100000:
+        dur /= 1000.0
+    return max(0.0, min(100.0, (off / dur) * 100.0))
+
+# ---- Persistenter Cache für available_episodes -------------------------------
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "tautulli-export-watched", "cache.sqlite")
+
+def _server_id(base_url: str) -> str:
+    """Kurzer Hash der Server-URL, damit mehrere Tautulli-Instanzen sich den Cache teilen können."""
+    return hashlib.sha1(base_url.rstrip("/").encode("utf-8")).hexdigest()[:16]
+
+# spätestens nach so vielen TTL-Perioden wird trotz unverändertem updated_at neu gezählt
+RECOUNT_AFTER_TTLS = 7
+
+class _AvailCache:
+    """
+    sqlite-Cache: (Server, show_rating_key) -> (leaf_count, updated_at), mit TTL in Sekunden.
+    counted_at merkt die letzte echte Zählung; touch() verlängert nur ts.
+    Thread-sicher über ein Lock, da compute_available_after parallel abfragt.
+    """
+    def __init__(self, path: str, ttl: float):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.ttl = ttl
+        self.disabled = False
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS cache "
+                         "(key TEXT PRIMARY KEY, leaf_count INT, ts INT, updated_at TEXT, counted_at INT)")
+        # Cache-Dateien älterer Versionen nachrüsten
+        cols = {row[1] for row in self._db.execute("PRAGMA table_info(cache)")}
+        if "updated_at" not in cols:
+            self._db.execute("ALTER TABLE cache ADD COLUMN updated_at TEXT")
+        if "counted_at" not in cols:
+            self._db.execute("ALTER TABLE cache ADD COLUMN counted_at INT")
+        self._db.commit()
+
+    @staticmethod
+    def key(base_url: str, show_rating_key: str) -> str:
+        return f"{_server_id(base_url)}:{show_rating_key}"
+
+    def _failed(self, e: sqlite3.Error) -> None:
+        # Cache-Fehler (gesperrt, Platte voll, …) nie zum Export-Fehler machen: für den Rest des
+        # Laufs abschalten, damit nicht jeder Zugriff erneut in den sqlite-Timeout läuft
+        if not self.disabled:
+            self.disabled = True
+            logging.warning("Cache-Fehler (%s) – fahre ohne Cache fort", e)
+
+    def get(self, key: str) -> Optional[int]:
+        if self.disabled:
+            return None
+        try:
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT leaf_count FROM cache WHERE key=? AND ts > ?", (key, int(time.time() - self.ttl))
+                ).fetchone()
+        except sqlite3.Error as e:
+            self._failed(e)
+            return None
+        return None if row is None else int(row[0])
+
+    def get_revalidatable(self, key: str) -> Optional[Tuple[int, Optional[str]]]:
+        """
+        Abgelaufener Eintrag zur Prüfung gegen updated_at – aber nur, solange die letzte echte
+        Zählung jünger als RECOUNT_AFTER_TTLS × TTL ist (Plex ändert updatedAt nicht immer).
+        """
+        if self.disabled:
+            return None
+        min_counted = int(time.time() - RECOUNT_AFTER_TTLS * self.ttl)
+        try:
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT leaf_count, updated_at FROM cache WHERE key=? AND counted_at > ?", (key, min_counted)
+                ).fetchone()
+        except sqlite3.Error as e:
+            self._failed(e)
+            return None
+        return None if row is None else (int(row[0]), row[1])
+
+    def put(self, key: str, leaf_count: int, updated_at: Optional[str] = None) -> None:
+        if self.disabled:
+            return
+        now = int(time.time())
+        try:
+            with self._lock:
+                self._db.execute("INSERT OR REPLACE INTO cache (key, leaf_count, ts, updated_at, counted_at) "
+                                 "VALUES (?, ?, ?, ?, ?)", (key, int(leaf_count), now, updated_at, now))
+                self._db.commit()
+        except sqlite3.Error as e:
+            self._failed(e)
+
+    def touch(self, key: str) -> None:
+        if self.disabled:
+            return
+        try:
+            with self._lock:
+                self._db.execute("UPDATE cache SET ts=? WHERE key=?", (int(time.time()), key))
+                self._db.commit()
+        except sqlite3.Error as e:
+            self._failed(e)
+
+    def close(self) -> None:
+        try:
+            with self._lock:
+                self._db.close()
+        except sqlite3.Error as e:
+            self._failed(e)
+
+# wird in main() gesetzt; None = kein Cache (--no-cache)
+_avail_cache: Optional[_AvailCache] = None
 
 # ---- Verfügbare Episoden pro Serie (Show-Rating-Key) -------------------------
-def count_available_episodes(base_url: str, apikey: str, show_rating_key: str) -> int:
+def _leaf_count(md: Any) -> Optional[int]:
+    if isinstance(md, dict):
+        for k in ("leaf_count", "leafCount", "episode_count"):
+            if k in md and md[k] is not None:
+                return int(md[k])
+    return None
+
+def _updated_at(md: Any) -> Optional[str]:
+    if isinstance(md, dict):
+        for k in ("updated_at", "updatedAt"):
+            if md.get(k):
+                return str(md[k])
+    return None
+
+def count_available_episodes(client: TautulliClient, show_rating_key: str) -> int:
+    """
+    Liefert leaf_count aus dem persistenten Cache, sonst über die API (siehe _fetch_available_episodes).
+    Bei abgelaufenem Eintrag gilt der leaf_count aus get_metadata; fehlt er dort, erspart ein
+    unverändertes updated_at den Season-Durchlauf (begrenzt durch RECOUNT_AFTER_TTLS).
+    """
+    if _avail_cache is None:
+        return _fetch_available_episodes(client, show_rating_key)
+    key = _AvailCache.key(client.base_url, show_rating_key)
+    cached = _avail_cache.get(key)
+    if cached is not None:
+        return cached
+    try:
+        md = call_api(client, "get_metadata", rating_key=show_rating_key)
+    except API_ERRORS:
+        md = None
+    updated_at = _updated_at(md)
+    try:
+        cnt = _leaf_count(md)
+    except (ValueError, TypeError):
+        cnt = None
+    if cnt is not None:
+        if cnt > 0:
+            _avail_cache.put(key, cnt, updated_at)
+        return cnt
+    stale = _avail_cache.get_revalidatable(key)
+    if stale is not None and updated_at is not None and stale[1] == updated_at:
+        # Serie unverändert -> nur TTL erneuern
+        _avail_cache.touch(key)
+        return stale[0]
+    avail = _fetch_available_episodes(client, show_rating_key, md)
+    # 0 ist meist ein API-Fehler -> nicht cachen
+    if avail > 0:
+        _avail_cache.put(key, avail, updated_at)
+    return avail
+
+# Marker für "get_metadata noch nicht abgefragt" (None heißt: Abfrage fehlgeschlagen)
+_NOT_FETCHED = object()
+
+def _fetch_available_episodes(client: TautulliClient, show_rating_key: str, md: Any = _NOT_FETCHED) -> int:
     """
-    Fast Path: get_metadata -> leaf_count
+    Fast Path: get_metadata -> leaf_count (md, falls bereits geladen)
     Fallback:  get_children_metadata(show)->Seasons -> je Season get_children_metadata(season)->children_count
     """
     # Fast Path
     try:
-        md = call_api(base_url, apikey, "get_metadata", rating_key=show_rating_key)
-        if isinstance(md, dict):
-            for k in ("leaf_count", "leafCount", "episode_count"):
-                if k in md and md[k] is not None:
-                    return int(md[k])
-    except Exception:
+        if md is _NOT_FETCHED:
+            md = call_api(client, "get_metadata", rating_key=show_rating_key)
+        cnt = _leaf_count(md)
+        if cnt is not None:
+            return cnt
+    except API_ERRORS:
         pass
     # Fallback
     total_eps = 0
     try:
-        seasons = call_api(base_url, apikey, "get_children_metadata",
+        seasons = call_api(client, "get_children_metadata",
                            rating_key=show_rating_key, media_type="show")
         season_list = []
         if isinstance(seasons, dict):
@@ -143,7 +468,7 @@ def count_available_episodes(base_url: str, apikey: str, show_rating_key: str) -
             season_key = s.get("rating_key") or s.get("ratingKey")
             if not season_key:
                 continue
-            eps = call_api(base_url, apikey, "get_children_metadata",
+            eps = call_api(client, "get_children_metadata",
                            rating_key=season_key, media_type="season")
             if isinstance(eps, dict):
                 cnt = eps.get("children_count")
@@ -152,147 +477,255 @@ def count_available_episodes(base_url: str, apikey: str, show_rating_key: str) -
             else:
                 cnt = len(eps or [])
             total_eps += int(cnt or 0)
-    except Exception:
+    except API_ERRORS:
         return total_eps
     return total_eps
 
 # ---------------------- Aggregation: Serien -----------------------------------
-def aggregate_series(rows: List[Dict[str, Any]], watched_threshold: float = 85.0) -> List[Dict[str, Any]]:
+class _SeriesBucket:
+    """Akkumulator je Serie; __slots__ statt dict spart Speicher und Lookups."""
+    __slots__ = ("show_title", "show_rating_key", "first_watched", "last_watched",
+                 "pct_sum", "pct_n", "seen_watched", "seen_partial")
+
+    def __init__(self, show_title: str, show_rating_key: str, tsr: str):
+        self.show_title = show_title
+        self.show_rating_key = show_rating_key
+        self.first_watched = tsr
+        self.last_watched = tsr
+        self.pct_sum = 0.0
+        self.pct_n = 0
+        self.seen_watched: set = set()
+        self.seen_partial: set = set()
+
+    def as_row(self) -> Dict[str, Any]:
+        return {
+            "show_title": self.show_title,
+            "show_rating_key": self.show_rating_key,
+            "unique_episodes_watched": len(self.seen_watched),
+            "episodes_partial": len(self.seen_partial),
+            "avg_episode_percent": round(self.pct_sum / self.pct_n, 2) if self.pct_n else 0.0,
+            "first_watched": self.first_watched,
+            "last_watched": self.last_watched,
+            # Platzhalter; wird von compute_available_after gefüllt
+            "available_episodes": 0,
+            "percent_watched_show": "",
+        }
+
+def _show_title(r_get) -> str:
+    return r_get("grandparent_title") or r_get("full_title") or r_get("title") or "Unbekannt"
+
+class SeriesAggregator:
     """
     Aggregiert Plays zu Serien-Zeilen (ohne available_episodes; das macht compute_available_after).
+    Zeilenweise über add(), damit ein History-Stream mehrere Aggregatoren speisen kann.
     """
-    series: Dict[str, Dict[str, Any]] = {}
-    for r in rows:
-        show_key = str(r.get("grandparent_rating_key") or "")
-        show_title = r.get("grandparent_title") or r.get("full_title") or r.get("title") or "Unbekannt"
-        ep_key = str(r.get("rating_key") or "")
-        tsr = _ts_readable(r.get("date") or r.get("stopped") or r.get("started") or r.get("last_played"))
+    def __init__(self, watched_threshold: float = 85.0):
+        self.watched_threshold = watched_threshold
+        self._series: Dict[str, _SeriesBucket] = {}
+        self._get = self._series.get
+
+    def add(self, r: Dict[str, Any]) -> None:
+        r_get = r.get
+        show_key = str(r_get("grandparent_rating_key") or "")
+        ep_key = str(r_get("rating_key") or "")
+        tsr = _ts_readable(r_get("date") or r_get("stopped") or r_get("started") or r_get("last_played"))
         pct = _percent_from_row(r)
-        is_watched = (pct is None or pct >= watched_threshold)
-
-        bucket = series.setdefault(show_key or show_title, {
-            "show_title": show_title,
-            "show_rating_key": show_key,
-            "unique_episodes_watched": 0,
-            "episodes_partial": 0,
-            "avg_episode_percent": 0.0,
-            "first_watched": tsr,
-            "last_watched": tsr,
-            "_plays_count": 0,
-            "_seen_watched": set(),
-            "_seen_partial": set(),
-        })
-
-        # Durchschnitt (über Plays)
+
+        # Titel ist gruppen-invariant -> nur ohne Key oder beim Anlegen des Buckets ermitteln
+        if show_key:
+            bucket = self._get(show_key)
+            if bucket is None:
+                bucket = self._series[show_key] = _SeriesBucket(_show_title(r_get), show_key, tsr)
+        else:
+            show_title = _show_title(r_get)
+            bucket = self._get(show_title)
+            if bucket is None:
+                bucket = self._series[show_title] = _SeriesBucket(show_title, show_key, tsr)
+
+        # Durchschnitt (über Plays mit bekanntem Prozentwert; geteilt wird erst in as_row)
         if pct is not None:
-            bucket["avg_episode_percent"] = (
-                (bucket["avg_episode_percent"] * bucket["_plays_count"] + pct) / (bucket["_plays_count"] + 1)
-            )
-        bucket["_plays_count"] += 1
+            bucket.pct_sum += pct
+            bucket.pct_n += 1
 
         # Unique Episoden (nach Schwelle)
         if ep_key:
-            if is_watched:
-                bucket["_seen_watched"].add(ep_key)
+            if pct is None or pct >= self.watched_threshold:
+                bucket.seen_watched.add(ep_key)
             else:
                 # nur als partial zählen, wenn nicht bereits "voll" gesehen
-                if ep_key not in bucket["_seen_watched"]:
-                    bucket["_seen_partial"].add(ep_key)
+                if ep_key not in bucket.seen_watched:
+                    bucket.seen_partial.add(ep_key)
 
         # Zeit
         if tsr:
-            if not bucket["first_watched"] or tsr < bucket["first_watched"]:
-                bucket["first_watched"] = tsr
-            if not bucket["last_watched"] or tsr > bucket["last_watched"]:
-                bucket["last_watched"] = tsr
-
-    # finalize
-    out: List[Dict[str, Any]] = []
-    for b in series.values():
-        b["unique_episodes_watched"] = len(b["_seen_watched"])
-        b["episodes_partial"] = len(b["_seen_partial"])
-        b["avg_episode_percent"] = round(b["avg_episode_percent"], 2)
-        # Platzhalter; wird später gefüllt
-        b["available_episodes"] = 0
-        b["percent_watched_show"] = ""
-        # Cleanup
-        b.pop("_plays_count", None); b.pop("_seen_watched", None); b.pop("_seen_partial", None)
-        out.append(b)
-
-    out.sort(key=lambda x: (x["show_title"] or "").lower())
-    return out
-
-def compute_available_after(base_url: str, apikey: str, series_rows: List[Dict[str, Any]]):
+            if not bucket.first_watched or tsr < bucket.first_watched:
+                bucket.first_watched = tsr
+            if not bucket.last_watched or tsr > bucket.last_watched:
+                bucket.last_watched = tsr
+
+    def __len__(self) -> int:
+        return len(self._series)
+
+    def iter_rows(self) -> Iterator[Dict[str, Any]]:
+        # sort(key=…) berechnet den Schlüssel genau einmal je Eintrag (decorate-sort-undecorate)
+        ordered = sorted(self._series.values(), key=lambda b: (b.show_title or "").lower())
+        return (b.as_row() for b in ordered)
+
+    def rows(self) -> List[Dict[str, Any]]:
+        return list(self.iter_rows())
+
+def _feed(agg, rows: Iterable[Dict[str, Any]]):
+    add = agg.add
+    for r in rows:
+        add(r)
+    return agg
+
+def aggregate_series(rows: Iterable[Dict[str, Any]], watched_threshold: float = 85.0) -> List[Dict[str, Any]]:
+    return _feed(SeriesAggregator(watched_threshold), rows).rows()
+
+def _apply_available(i: int, n: int, row: Dict[str, Any], avail: Any) -> None:
+    row["available_episodes"] = int(avail or 0)
+    if row["available_episodes"] > 0:
+        row["percent_watched_show"] = round(
+            (row["unique_episodes_watched"] / row["available_episodes"]) * 100.0, 2
+        )
+    logging.info("  [Serie %d/%d] %s: available=%s, watched=%s",
+                 i, n, row.get("show_title"),
+                 row["available_episodes"], row["unique_episodes_watched"])
+
+def compute_available_after(client: TautulliClient, series_rows: List[Dict[str, Any]]):
     n = len(series_rows)
     if n == 0:
         return
     logging.info("Ermittle verfügbare Episoden je Serie…")
-    for i, row in enumerate(series_rows, 1):
-        show_key = row.get("show_rating_key") or ""
-        if show_key:
+    pending = [row for row in series_rows if row.get("show_rating_key")]
+
+    # Serien ohne show_rating_key: nichts abzufragen, aber wie gehabt mitzählen und loggen
+    i = 0
+    for row in series_rows:
+        if not row.get("show_rating_key"):
+            i += 1
+            _apply_available(i, n, row, 0)
+
+    # Netzwerk-gebunden (Cache-Treffer kosten nichts) -> Requests je Serie parallel absetzen
+    with ThreadPoolExecutor(max_workers=AVAIL_WORKERS) as ex:
+        futures = {
+            ex.submit(count_available_episodes, client, row["show_rating_key"]): row
+            for row in pending
+        }
+        for fut in as_completed(futures):
+            i += 1
+            row = futures[fut]
             try:
-                avail = count_available_episodes(base_url, apikey, show_key)
+                avail = fut.result()
             except Exception as e:
                 logging.warning("  [%d/%d] %s – Fehler: %s", i, n, row.get("show_title"), e)
                 avail = 0
-        else:
-            avail = 0
-        row["available_episodes"] = int(avail or 0)
-        if row["available_episodes"] > 0:
-            row["percent_watched_show"] = round(
-                (row["unique_episodes_watched"] / row["available_episodes"]) * 100.0, 2
-            )
-        else:
-            row["percent_watched_show"] = ""
-        logging.info("  [Serie %d/%d] %s: available=%s, watched=%s",
-                     i, n, row.get("show_title"),
-                     row["available_episodes"], row["unique_episodes_watched"])
+            _apply_available(i, n, row, avail)
 
 # ---------------------- Aggregation: Filme ------------------------------------
-def aggregate_movies(rows: List[Dict[str, Any]], watched_threshold: float = 85.0) -> List[Dict[str, Any]]:
-    movies: Dict[str, Dict[str, Any]] = {}
-    for r in rows:
-        key = str(r.get("rating_key") or r.get("parent_rating_key") or "")
-        title = r.get("title") or r.get("full_title") or "Unbekannt"
-        year = r.get("year") or ""
-        tsr = _ts_readable(r.get("date") or r.get("stopped") or r.get("started") or r.get("last_played"))
+class _MovieBucket:
+    """Akkumulator je Film (siehe _SeriesBucket)."""
+    __slots__ = ("movie_title", "year", "plays", "max_percent", "pct_sum", "pct_n",
+                 "last_percent", "completed_any", "first_watched", "last_watched")
+
+    def __init__(self, movie_title: str, year: Any, tsr: str):
+        self.movie_title = movie_title
+        self.year = year
+        self.plays = 0
+        self.max_percent = 0.0
+        self.pct_sum = 0.0
+        self.pct_n = 0
+        self.last_percent: Optional[float] = None
+        self.completed_any = False
+        self.first_watched = tsr
+        self.last_watched = tsr
+
+    def as_row(self) -> Dict[str, Any]:
+        return {
+            "movie_title": self.movie_title,
+            "year": self.year,
+            "plays": self.plays,
+            "max_percent": round(self.max_percent, 2),
+            "avg_percent": round(self.pct_sum / self.pct_n, 2) if self.pct_n else 0.0,
+            "last_percent": round(self.last_percent, 2) if self.last_percent is not None else None,
+            "completed_any": self.completed_any,
+            "first_watched": self.first_watched,
+            "last_watched": self.last_watched,
+        }
+
+class MovieAggregator:
+    """Aggregiert Plays zu Film-Zeilen (siehe SeriesAggregator)."""
+    def __init__(self, watched_threshold: float = 85.0):
+        self.watched_threshold = watched_threshold
+        self._movies: Dict[str, _MovieBucket] = {}
+        self._get = self._movies.get
+
+    def add(self, r: Dict[str, Any]) -> None:
+        r_get = r.get
+        key = str(r_get("rating_key") or r_get("parent_rating_key") or "")
+        tsr = _ts_readable(r_get("date") or r_get("stopped") or r_get("started") or r_get("last_played"))
         pct = _percent_from_row(r)
-        watched = (pct is None or pct >= watched_threshold)
-
-        bucket = movies.setdefault(key or f"{title} ({year})", {
-            "movie_title": title, "year": year, "plays": 0,
-            "max_percent": 0.0, "avg_percent": 0.0, "last_percent": None,
-            "completed_any": False, "first_watched": tsr, "last_watched": tsr,
-        })
-        bucket["plays"] += 1
+
+        # Titel/Jahr nur ohne Key oder beim Anlegen des Buckets ermitteln
+        bucket = self._get(key) if key else None
+        if bucket is None:
+            title = r_get("title") or r_get("full_title") or "Unbekannt"
+            year = r_get("year") or ""
+            key = key or f"{title} ({year})"
+            bucket = self._get(key)
+            if bucket is None:
+                bucket = self._movies[key] = _MovieBucket(title, year, tsr)
+        bucket.plays += 1
         if pct is not None:
-            bucket["max_percent"] = max(bucket["max_percent"], float(pct))
-            bucket["avg_percent"] = ((bucket["avg_percent"] * (bucket["plays"] - 1)) + float(pct)) / bucket["plays"]
-            bucket["last_percent"] = float(pct)
-        if watched:
-            bucket["completed_any"] = True
+            if pct > bucket.max_percent:
+                bucket.max_percent = pct
+            bucket.pct_sum += pct
+            bucket.pct_n += 1
+            bucket.last_percent = pct
+        if pct is None or pct >= self.watched_threshold:
+            bucket.completed_any = True
         if tsr:
-            if not bucket["first_watched"] or tsr < bucket["first_watched"]:
-                bucket["first_watched"] = tsr
-            if not bucket["last_watched"] or tsr > bucket["last_watched"]:
-                bucket["last_watched"] = tsr
-
-    out = list(movies.values())
-    for b in out:
-        b["avg_percent"] = round(b["avg_percent"], 2)
-        if b["last_percent"] is not None:
-            b["last_percent"] = round(b["last_percent"], 2)
-        b["max_percent"] = round(b["max_percent"], 2)
-    out.sort(key=lambda x: ((x["movie_title"] or "").lower(), str(x.get("year") or "")))
-    return out
+            if not bucket.first_watched or tsr < bucket.first_watched:
+                bucket.first_watched = tsr
+            if not bucket.last_watched or tsr > bucket.last_watched:
+                bucket.last_watched = tsr
+
+    def __len__(self) -> int:
+        return len(self._movies)
+
+    def iter_rows(self) -> Iterator[Dict[str, Any]]:
+        ordered = sorted(self._movies.values(), key=lambda b: ((b.movie_title or "").lower(), str(b.year or "")))
+        return (b.as_row() for b in ordered)
+
+    def rows(self) -> List[Dict[str, Any]]:
+        return list(self.iter_rows())
+
+def aggregate_movies(rows: Iterable[Dict[str, Any]], watched_threshold: float = 85.0) -> List[Dict[str, Any]]:
+    return _feed(MovieAggregator(watched_threshold), rows).rows()
+
+def aggregate_history_both(client: TautulliClient, user_id: int, watched_threshold: float = 85.0):
+    """
+    Eine History-Abfrage ohne media_type für --export both --single-history-sweep; Zeilen werden
+    clientseitig auf Serien- und Film-Aggregation verteilt. Track- und Live-Plays werden dabei
+    mitgeladen und verworfen – bei viel Musik ist der getrennte Abruf je Typ günstiger. Liefert (series_rows, MovieAggregator); der
+    Serien-Aggregator samt Episoden-Sets wird dabei freigegeben.
+    """
+    s_agg = SeriesAggregator(watched_threshold)
+    m_agg = MovieAggregator(watched_threshold)
+    route = {"episode": s_agg.add, "movie": m_agg.add}
+    for r in iter_history(client, user_id, None):
+        add = route.get(r.get("media_type"))
+        if add is not None:
+            add(r)
+    return s_agg.rows(), m_agg
 
 # ---------------------------- Speichern ---------------------------------------
-def save_csv(path: str, rows: List[Dict[str, Any]], columns: List[str]) -> None:
+def save_csv(path: str, rows: Iterable[Dict[str, Any]], columns: List[str]) -> None:
     with open(path, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=columns)
-        w.writeheader()
-        for r in rows:
-            w.writerow({c: r.get(c, "") for c in columns})
+        w = csv.writer(f)
+        w.writerow(columns)
+        w.writerows([r.get(c, "") for c in columns] for r in rows)
 
 # --------------------------------- Main ---------------------------------------
 def main():
@@ -306,17 +739,41 @@ def main():
     p.add_argument("--json", dest="json_out", default=None)
     p.add_argument("--watched-threshold", type=float, default=85.0)
     p.add_argument("--log-level", default="INFO")
+    p.add_argument("--workers", type=int, default=AVAIL_WORKERS,
+                   help="parallele API-Requests (default: 16; History nutzt die Hälfte)")
+    p.add_argument("--single-history-sweep", action="store_true",
+                   help="bei --export both die History in einem Durchlauf ohne media_type laden; "
+                        "lohnt nur ohne nennenswerte Musik-/Live-Plays, die sonst mitgeladen und verworfen werden")
+    p.add_argument("--avail-ttl", type=float, default=24.0,
+                   help="Gültigkeit des available_episodes-Caches in Stunden (default: 24)")
+    p.add_argument("--cache-file", default=DEFAULT_CACHE_PATH)
+    p.add_argument("--no-cache", action="store_true", help="persistenten Cache nicht verwenden")
+    p.add_argument("--refresh-users", action="store_true", help="gecachte user_id verwerfen und neu auflösen")
     args = p.parse_args()
 
     setup_logging(args.log_level)
+    configure_concurrency(args.workers)
+
+    global _avail_cache
+    if not args.no_cache:
+        try:
+            _avail_cache = _AvailCache(args.cache_file, args.avail_ttl * 3600)
+        except (OSError, sqlite3.Error) as e:
+            logging.warning("Cache nicht verfügbar (%s) – fahre ohne fort", e)
 
     t_total = time.time()
     logging.info("Starte Export für User '%s'…", args.user)
 
+    client = TautulliClient(args.url, args.apikey)
+
     # user_id
     try:
         t0 = time.time()
-        user_id = resolve_user_id(args.url, args.apikey, args.user)
+        if args.no_cache:
+            user_id = resolve_user_id(client, args.user)
+        else:
+            user_cache = os.path.join(os.path.dirname(os.path.abspath(args.cache_file)), "users.json")
+            user_id = resolve_user_id_cached(client, args.user, user_cache, args.refresh_users)
         logging.info("User-Auflösung: %s", fmt_duration(time.time() - t0))
     except Exception as e:
         logging.error("Konnte user_id nicht auflösen: %s", e)
@@ -324,20 +781,32 @@ def main():
 
     series_rows: List[Dict[str, Any]] = []
     movies_rows: List[Dict[str, Any]] = []
+    both_result = None
+
+    # Beide (opt-in): ein gemeinsamer History-Durchlauf statt zwei; bei Fehler getrennt laden
+    if args.export == "both" and args.single_history_sweep:
+        try:
+            t0 = time.time()
+            both_result = aggregate_history_both(client, user_id, watched_threshold=args.watched_threshold)
+            logging.info("History geladen & aggregiert in %s (Serien: %d, Filme: %d)",
+                         fmt_duration(time.time() - t0), len(both_result[0]), len(both_result[1]))
+        except Exception as e:
+            logging.warning("Gemeinsamer History-Abruf fehlgeschlagen (%s) – lade getrennt", e)
 
     # Serien
     if args.export in ("series", "both"):
         try:
-            t1 = time.time()
-            hist_eps = fetch_history(args.url, args.apikey, user_id, "episode")
-            logging.info("History (Episoden) geladen in %s", fmt_duration(time.time() - t1))
-
-            t2 = time.time()
-            series_rows = aggregate_series(hist_eps, watched_threshold=args.watched_threshold)
-            logging.info("Aggregation Serien: %s (Serien: %d)", fmt_duration(time.time() - t2), len(series_rows))
+            if both_result is not None:
+                series_rows = both_result[0]
+            else:
+                t1 = time.time()
+                series_rows = aggregate_series(iter_history(client, user_id, "episode"),
+                                               watched_threshold=args.watched_threshold)
+                logging.info("History (Episoden) geladen & aggregiert in %s (Serien: %d)",
+                             fmt_duration(time.time() - t1), len(series_rows))
 
             t3 = time.time()
-            compute_available_after(args.url, args.apikey, series_rows)
+            compute_available_after(client, series_rows)
             logging.info("Verfügbare Episoden ermittelt: %s", fmt_duration(time.time() - t3))
 
             out_csv = args.out_series or f"watched_series_{args.user}.csv"
@@ -358,20 +827,28 @@ def main():
     # Filme
     if args.export in ("movies", "both"):
         try:
-            t4 = time.time()
-            hist_mov = fetch_history(args.url, args.apikey, user_id, "movie")
-            logging.info("History (Filme) geladen in %s", fmt_duration(time.time() - t4))
-
-            t5 = time.time()
-            movies_rows = aggregate_movies(hist_mov, watched_threshold=args.watched_threshold)
-            logging.info("Aggregation Filme: %s (Filme: %d)", fmt_duration(time.time() - t5), len(movies_rows))
-
+            if both_result is not None:
+                m_agg = both_result[1]
+                both_result = None
+            else:
+                t4 = time.time()
+                m_agg = _feed(MovieAggregator(args.watched_threshold), iter_history(client, user_id, "movie"))
+                logging.info("History (Filme) geladen & aggregiert in %s (Filme: %d)",
+                             fmt_duration(time.time() - t4), len(m_agg))
+
+            # Zeilen nur für --json vorhalten, sonst direkt aus den Buckets in die CSV schreiben
+            if args.json_out:
+                movies_rows = m_agg.rows()
+                movie_out: Iterable[Dict[str, Any]] = movies_rows
+            else:
+                movie_out = m_agg.iter_rows()
             out_csv = args.out_movies or f"watched_movies_{args.user}.csv"
-            save_csv(out_csv, movies_rows, [
+            save_csv(out_csv, movie_out, [
                 "movie_title", "year", "plays", "max_percent", "avg_percent",
                 "last_percent", "completed_any", "first_watched", "last_watched"
             ])
-            logging.info("✓ Filme-CSV: %s  (Filme: %d)", out_csv, len(movies_rows))
+            logging.info("✓ Filme-CSV: %s  (Filme: %d)", out_csv, len(m_agg))
+            m_agg = None  # Buckets nicht bis zum JSON-Export mitschleppen
         except Exception as e:
             logging.error("Film-Export fehlgeschlagen: %s", e)
 
@@ -379,12 +856,18 @@ def main():
     if args.json_out:
         try:
             payload = {"user": args.user, "series": series_rows, "movies": movies_rows}
-            with open(args.json_out, "w", encoding="utf-8") as f:
-                json.dump(payload, f, ensure_ascii=False, indent=2)
+            if orjson is not None:
+                with open(args.json_out, "wb") as f:
+                    f.write(orjson.dumps(payload, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+            else:
+                with open(args.json_out, "w", encoding="utf-8") as f:
+                    json.dump(payload, f, ensure_ascii=False, indent=2)
             logging.info("✓ JSON exportiert: %s", args.json_out)
         except Exception as e:
             logging.error("JSON-Export fehlgeschlagen: %s", e)
 
+    if _avail_cache is not None:
+        _avail_cache.close()
     logging.info("Fertig in %s ✅", fmt_duration(time.time() - t_total))
 
 if __name__ == "__main__":